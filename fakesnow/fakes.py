@@ -162,55 +162,13 @@ class FakeSnowflakeCursor:
                 sqlstate="22000",
             )
 
-        transformed = (
-            expression.transform(transforms.upper_case_unquoted_identifiers)
-            .transform(transforms.set_schema, current_database=self._conn.database)
-            .transform(transforms.create_database, db_path=self._conn.db_path)
-            .transform(transforms.extract_comment_on_table)
-            .transform(transforms.extract_comment_on_columns)
-            .transform(transforms.information_schema_fs_columns_snowflake)
-            .transform(transforms.information_schema_fs_tables_ext)
-            .transform(transforms.drop_schema_cascade)
-            .transform(transforms.tag)
-            .transform(transforms.semi_structured_types)
-            .transform(transforms.try_parse_json)
-            # indices_to_json_extract must be before regex_substr
-            .transform(transforms.indices_to_json_extract)
-            .transform(transforms.json_extract_cast_as_varchar)
-            .transform(transforms.json_extract_cased_as_varchar)
-            .transform(transforms.json_extract_precedence)
-            .transform(transforms.flatten)
-            .transform(transforms.regex_replace)
-            .transform(transforms.regex_substr)
-            .transform(transforms.values_columns)
-            .transform(transforms.to_date)
-            .transform(transforms.to_decimal)
-            .transform(transforms.to_timestamp_ntz)
-            .transform(transforms.to_timestamp)
-            .transform(transforms.object_construct)
-            .transform(transforms.timestamp_ntz_ns)
-            .transform(transforms.float_to_double)
-            .transform(transforms.integer_precision)
-            .transform(transforms.extract_text_length)
-            .transform(transforms.sample)
-            .transform(transforms.array_size)
-            .transform(transforms.random)
-            .transform(transforms.identifier)
-            .transform(transforms.array_agg_within_group)
-            .transform(transforms.array_agg_to_json)
-            .transform(lambda e: transforms.show_schemas(e, self._conn.database))
-            .transform(lambda e: transforms.show_objects_tables(e, self._conn.database))
-            # TODO collapse into a single show_keys function
-            .transform(lambda e: transforms.show_keys(e, self._conn.database, kind="PRIMARY"))
-            .transform(lambda e: transforms.show_keys(e, self._conn.database, kind="UNIQUE"))
-            .transform(lambda e: transforms.show_keys(e, self._conn.database, kind="FOREIGN"))
-            .transform(transforms.show_users)
-            .transform(transforms.create_user)
+        transformed = transforms.apply_transforms(
+            expression, current_database=self._conn.database, db_path=self._conn.db_path
         )
         sql = transformed.sql(dialect="duckdb")
         result_sql = None
 
-        if transformed.find(exp.Select) and (seed := transformed.args.get("seed")):
+        if (seed := transformed.args.get("seed")) and transformed.find(exp.Select):
             sql = f"SELECT setseed({seed}); {sql}"
 
         if fs_debug := os.environ.get("FAKESNOW_DEBUG"):
@@ -1,29 +1,43 @@
 from __future__ import annotations
 
+import re
+from collections.abc import Callable, Mapping
+from functools import cache, lru_cache, partial
 from pathlib import Path
-from string import Template
 from typing import Literal, cast
 
-import sqlglot
-from sqlglot import exp
+from sqlglot import exp, parse_one
 
 from fakesnow.global_database import USERS_TABLE_FQ_NAME
 
 MISSING_DATABASE = "missing_database"
-SUCCESS_NOP = sqlglot.parse_one("SELECT 'Statement executed successfully.'")
+
+
+def _success_nop() -> exp.Select:
+    # constructed directly rather than parsed or deep copied, because it replaces every statement duckdb can't execute
+    return exp.Select(expressions=[exp.Literal(this="Statement executed successfully.", is_string=True)])
+
+
+SUCCESS_NOP = _success_nop()
+
+
+@lru_cache(maxsize=1024)
+def _upper(name: str) -> str:
+    # function names aren't identifiers so keep the case they were written in, but the same few recur in every query
+    return name.upper()
 
 
 def array_size(expression: exp.Expression) -> exp.Expression:
-    if isinstance(expression, exp.ArraySize):
+    if type(expression) is exp.ArraySize:
         # case is used to convert 0 to null, because null is returned by duckdb when no case matches
         jal = exp.Anonymous(this="json_array_length", expressions=[expression.this])
-        return exp.Case(ifs=[exp.If(this=jal, true=jal)])
+        return exp.Case(ifs=[exp.If(this=jal, true=jal.copy())])
 
     return expression
 
 
 def array_agg_to_json(expression: exp.Expression) -> exp.Expression:
-    if isinstance(expression, exp.ArrayAgg):
+    if type(expression) is exp.ArrayAgg:
         return exp.Anonymous(this="TO_JSON", expressions=[expression])
 
     return expression
@@ -70,11 +84,16 @@ def create_database(expression: exp.Expression, db_path: Path | None = None) ->
         exp.Expression: The transformed expression, with the database name stored in the create_db_name arg.
     """
 
-    if isinstance(expression, exp.Create) and str(expression.args.get("kind")).upper() == "DATABASE":
+    if (
+        isinstance(expression, exp.Create)
+        and (kind := expression.args.get("kind"))
+        and isinstance(kind, str)
+        and kind.upper() == "DATABASE"
+    ):
         ident = expression.find(exp.Identifier)
         assert ident, f"No identifier in {expression.sql}"
         db_name = ident.this
-        db_file = f"{db_path/db_name}.db" if db_path else ":memory:"
+        db_file = _db_file(db_path, db_name)
 
         return exp.Command(
             this="ATTACH",
@@ -85,8 +104,12 @@ def create_database(expression: exp.Expression, db_path: Path | None = None) ->
     return expression
 
 
-SQL_DESCRIBE_TABLE = Template(
-    """
+@lru_cache(maxsize=256)
+def _db_file(db_path: Path | None, db_name: str) -> str:
+    return f"{db_path/db_name}.db" if db_path else ":memory:"
+
+
+SQL_DESCRIBE_TABLE = """
 SELECT
     column_name AS "name",
     CASE WHEN data_type = 'NUMBER' THEN 'NUMBER(' || numeric_precision || ',' || numeric_scale || ')'
@@ -107,10 +130,12 @@ SELECT
     NULL AS "policy name",
     NULL AS "privacy domain",
 FROM information_schema._fs_columns_snowflake
-WHERE table_catalog = '${catalog}' AND table_schema = '${schema}' AND table_name = '${table}'
 ORDER BY ordinal_position
 """
-)
+
+# the queries transforms return are parsed once into module constants like this one. Later passes edit the
+# returned tree in place, so transforms must hand out a copy, eg: via copy() or a builder like where()
+_DESCRIBE_TABLE = parse_one(SQL_DESCRIBE_TABLE, read="duckdb")
 
 
 def describe_table(
@@ -131,9 +156,12 @@ def describe_table(
         catalog = table.catalog or current_database
         schema = table.db or current_schema
 
-        return sqlglot.parse_one(
-            SQL_DESCRIBE_TABLE.substitute(catalog=catalog, schema=schema, table=table.name),
-            read="duckdb",
+        return _DESCRIBE_TABLE.where(
+            exp.and_(
+                exp.column("table_catalog").eq(exp.Literal.string(catalog)),
+                exp.column("table_schema").eq(exp.Literal.string(schema)),
+                exp.column("table_name").eq(exp.Literal.string(table.name)),
+            )
         )
 
     return expression
@@ -164,9 +192,8 @@ def drop_schema_cascade(expression: exp.Expression) -> exp.Expression:
     ):
         return expression
 
-    new = expression.copy()
-    new.args["cascade"] = True
-    return new
+    expression.args["cascade"] = True
+    return expression
 
 
 def extract_comment_on_columns(expression: exp.Expression) -> exp.Expression:
@@ -183,17 +210,18 @@ def extract_comment_on_columns(expression: exp.Expression) -> exp.Expression:
     """
 
     if isinstance(expression, exp.AlterTable) and (actions := expression.args.get("actions")):
-        new_actions: list[exp.Expression] = []
-        col_comments: list[tuple[str, str]] = []
-        for a in actions:
-            if isinstance(a, exp.AlterColumn) and (comment := a.args.get("comment")):
-                col_comments.append((a.name, comment.this))
-            else:
-                new_actions.append(a)
-        if not new_actions:
-            expression = SUCCESS_NOP.copy()
-        else:
-            expression.set("actions", new_actions)
+        col_comments: list[tuple[str, str]] = [
+            (a.name, comment.this)
+            for a in actions
+            if isinstance(a, exp.AlterColumn) and (comment := a.args.get("comment"))
+        ]
+        if len(col_comments) == len(actions):
+            expression = _success_nop()
+        elif col_comments:
+            # keep the actions duckdb can execute
+            expression.set(
+                "actions", [a for a in actions if not (isinstance(a, exp.AlterColumn) and a.args.get("comment"))]
+            )
         expression.args["col_comments"] = col_comments
 
     return expression
@@ -212,32 +240,47 @@ def extract_comment_on_table(expression: exp.Expression) -> exp.Expression:
         exp.Expression: The transformed expression, with any comment stored in the new 'table_comment' arg.
     """
 
-    if isinstance(expression, exp.Create) and (table := expression.find(exp.Table)):
+    if isinstance(expression, exp.Create):
+        return _comment_on_create(expression)
+    elif isinstance(expression, exp.Comment):
+        return _comment_on_comment(expression)
+    elif isinstance(expression, exp.AlterTable):
+        return _comment_on_alter_table(expression)
+
+    return expression
+
+
+def _comment_on_create(expression: exp.Expression) -> exp.Expression:
+    # CREATE TABLE ... COMMENT = '...'
+    if (props := cast(exp.Properties, expression.args.get("properties"))) and (table := expression.find(exp.Table)):
         comment = None
-        if props := cast(exp.Properties, expression.args.get("properties")):
-            other_props = []
-            for p in props.expressions:
-                if isinstance(p, exp.SchemaCommentProperty) and (isinstance(p.this, (exp.Literal, exp.Identifier))):
-                    comment = p.this.this
-                else:
-                    other_props.append(p)
+        other_props = []
+        for p in props.expressions:
+            if isinstance(p, exp.SchemaCommentProperty) and (isinstance(p.this, (exp.Literal, exp.Identifier))):
+                comment = p.this.this
+            else:
+                other_props.append(p)
 
-            new = expression.copy()
-            new_props: exp.Properties = new.args["properties"]
-            new_props.set("expressions", other_props)
-            new.args["table_comment"] = (table, comment)
-            return new
-    elif (
-        isinstance(expression, exp.Comment)
-        and (cexp := expression.args.get("expression"))
-        and (table := expression.find(exp.Table))
-    ):
-        new = SUCCESS_NOP.copy()
+        props.set("expressions", other_props)
+        expression.args["table_comment"] = (table, comment)
+
+    return expression
+
+
+def _comment_on_comment(expression: exp.Expression) -> exp.Expression:
+    # COMMENT ON TABLE ... IS '...'
+    if (cexp := expression.args.get("expression")) and (table := expression.find(exp.Table)):
+        new = _success_nop()
         new.args["table_comment"] = (table, cexp.this)
         return new
-    elif (
-        isinstance(expression, exp.AlterTable)
-        and (sexp := expression.find(exp.Set))
+
+    return expression
+
+
+def _comment_on_alter_table(expression: exp.Expression) -> exp.Expression:
+    # ALTER TABLE ... SET COMMENT = '...'
+    if (
+        (sexp := expression.find(exp.Set))
         and not sexp.args["tag"]
         and (eq := sexp.find(exp.EQ))
         and (eid := eq.find(exp.Identifier))
@@ -246,13 +289,16 @@ def extract_comment_on_table(expression: exp.Expression) -> exp.Expression:
         and (lit := eq.find(exp.Literal))
         and (table := expression.find(exp.Table))
     ):
-        new = SUCCESS_NOP.copy()
+        new = _success_nop()
         new.args["table_comment"] = (table, lit.this)
         return new
 
     return expression
 
 
+_TEXT_TYPES = frozenset({exp.DataType.Type.VARCHAR, exp.DataType.Type.TEXT})
+
+
 def extract_text_length(expression: exp.Expression) -> exp.Expression:
     """Extract length of text columns.
 
@@ -268,10 +314,11 @@ def extract_text_length(expression: exp.Expression) -> exp.Expression:
 
     if isinstance(expression, (exp.Create, exp.AlterTable)):
         text_lengths = []
-        for dt in expression.find_all(exp.DataType):
-            if dt.this in (exp.DataType.Type.VARCHAR, exp.DataType.Type.TEXT):
+        for dt in expression.walk():
+            if type(dt) is exp.DataType and dt.this in _TEXT_TYPES:
                 col_name = dt.parent and dt.parent.this and dt.parent.this.this
-                if dt_size := dt.find(exp.DataTypeParam):
+                # the size is a direct child, so read it rather than searching the subtree
+                if (params := dt.expressions) and isinstance(dt_size := params[0], exp.DataTypeParam):
                     size = (
                         isinstance(dt_size.this, exp.Literal)
                         and isinstance(dt_size.this.this, str)
@@ -330,7 +377,7 @@ def float_to_double(expression: exp.Expression) -> exp.Expression:
     see https://docs.snowflake.com/en/sql-reference/data-types-numeric#float-float4-float8
     """
 
-    if isinstance(expression, exp.DataType) and expression.this == exp.DataType.Type.FLOAT:
+    if type(expression) is exp.DataType and expression.this == exp.DataType.Type.FLOAT:
         expression.args["this"] = exp.DataType.Type.DOUBLE
 
     return expression
@@ -342,11 +389,7 @@ def identifier(expression: exp.Expression) -> exp.Expression:
     See https://docs.snowflake.com/en/sql-reference/identifier-literal
     """
 
-    if (
-        isinstance(expression, exp.Anonymous)
-        and isinstance(expression.this, str)
-        and expression.this.upper() == "IDENTIFIER"
-    ):
+    if type(expression) is exp.Anonymous and isinstance(name := expression.this, str) and _upper(name) == "IDENTIFIER":
         expression = exp.Identifier(this=expression.expressions[0].this, quoted=False)
 
     return expression
@@ -372,12 +415,8 @@ def indices_to_json_extract(expression: exp.Expression) -> exp.Expression:
         and isinstance(index, exp.Literal)
         and index.this
     ):
-        if index.is_string:
-            return exp.JSONExtract(this=expression.this, expression=exp.Literal(this=f"$.{index.this}", is_string=True))
-        else:
-            return exp.JSONExtract(
-                this=expression.this, expression=exp.Literal(this=f"$[{index.this}]", is_string=True)
-            )
+        path = f"$.{index.this}" if index.is_string else f"$[{index.this}]"
+        return exp.JSONExtract(this=expression.this, expression=exp.Literal(this=path, is_string=True))
 
     return expression
 
@@ -399,6 +438,15 @@ def information_schema_fs_columns_snowflake(expression: exp.Expression) -> exp.E
     return expression
 
 
+_FS_TABLES_EXT_ON = parse_one(
+    """
+    tables.table_catalog = _fs_tables_ext.ext_table_catalog AND
+    tables.table_schema = _fs_tables_ext.ext_table_schema AND
+    tables.table_name = _fs_tables_ext.ext_table_name
+    """
+)
+
+
 def information_schema_fs_tables_ext(expression: exp.Expression) -> exp.Expression:
     """Join to information_schema._fs_tables_ext to access additional metadata columns (eg: comment)."""
 
@@ -408,17 +456,8 @@ def information_schema_fs_tables_ext(expression: exp.Expression) -> exp.Expressi
         and tbl_exp.name.upper() == "TABLES"
         and tbl_exp.db.upper() == "INFORMATION_SCHEMA"
     ):
-        return expression.join(
-            "information_schema._fs_tables_ext",
-            on=(
-                """
-                tables.table_catalog = _fs_tables_ext.ext_table_catalog AND
-                tables.table_schema = _fs_tables_ext.ext_table_schema AND
-                tables.table_name = _fs_tables_ext.ext_table_name
-                """
-            ),
-            join_type="left",
-        )
+        # join copies the expression and its on condition
+        return expression.join("information_schema._fs_tables_ext", on=_FS_TABLES_EXT_ON, join_type="left")
 
     return expression
 
@@ -488,7 +527,7 @@ def json_extract_precedence(expression: exp.Expression) -> exp.Expression:
 
     See https://github.com/tekumara/fakesnow/issues/53
     """
-    if isinstance(expression, exp.JSONExtract):
+    if type(expression) is exp.JSONExtract:
         return exp.Paren(this=expression)
     return expression
 
@@ -501,6 +540,7 @@ def random(expression: exp.Expression) -> exp.Expression:
     """
     if isinstance(expression, exp.Select) and (rand := expression.find(exp.Rand)):
         # shift result to between min and max signed 64bit integer
+        # (constructed per call because that's cheaper than deep copying a pre-built template)
         new_rand = exp.Cast(
             this=exp.Paren(
                 this=exp.Mul(
@@ -541,16 +581,24 @@ def object_construct(expression: exp.Expression) -> exp.Expression:
     """
 
     if isinstance(expression, exp.Struct):
-        # remove expressions containing NULL
-        for enull in expression.find_all(exp.Null):
-            if enull.parent:
-                enull.parent.pop()
+        # remove expressions containing NULL, collected first so the walk isn't mutated while iterating,
+        # then popped in reverse so each removal is from the end of the remaining expressions
+        parents = [parent for node in expression.walk() if type(node) is exp.Null and (parent := node.parent)]
+        for parent in reversed(parents):
+            parent.pop()
 
         return exp.Anonymous(this="TO_JSON", expressions=[expression])
 
     return expression
 
 
+def _unescape_backslashes(pattern: str) -> str:
+    # snowflake requires escaping backslashes in single-quoted string constants, but duckdb doesn't
+    # see https://docs.snowflake.com/en/sql-reference/functions-regexp#label-regexp-escape-character-caveats
+    # most patterns don't contain backslashes, so check before copying
+    return pattern.replace("\\\\", "\\") if "\\\\" in pattern else pattern
+
+
 def regex_replace(expression: exp.Expression) -> exp.Expression:
     """Transform regex_replace expressions from snowflake to duckdb."""
 
@@ -561,10 +609,8 @@ def regex_replace(expression: exp.Expression) -> exp.Expression:
                 "REGEXP_REPLACE with additional parameters (eg: <position>, <occurrence>, <parameters>) not supported"
             )
 
-        # pattern: snowflake requires escaping backslashes in single-quoted string constants, but duckdb doesn't
-        # see https://docs.snowflake.com/en/sql-reference/functions-regexp#label-regexp-escape-character-caveats
         expression.args["expression"] = exp.Literal(
-            this=expression.expression.this.replace("\\\\", "\\"), is_string=True
+            this=_unescape_backslashes(expression.expression.this), is_string=True
         )
 
         if not expression.args.get("replacement"):
@@ -586,10 +632,8 @@ def regex_substr(expression: exp.Expression) -> exp.Expression:
     if isinstance(expression, exp.RegexpExtract):
         subject = expression.this
 
-        # pattern: snowflake requires escaping backslashes in single-quoted string constants, but duckdb doesn't
-        # see https://docs.snowflake.com/en/sql-reference/functions-regexp#label-regexp-escape-character-caveats
         pattern = expression.expression
-        pattern.args["this"] = pattern.this.replace("\\\\", "\\")
+        pattern.args["this"] = _unescape_backslashes(pattern.this)
 
         # number of characters from the beginning of the string where the function starts searching for matches
         try:
@@ -663,15 +707,13 @@ def set_schema(expression: exp.Expression, current_database: str | None) -> exp.
     """
 
     if (
-        isinstance(expression, exp.Use)
-        and (kind := expression.args.get("kind"))
-        and isinstance(kind, exp.Var)
-        and kind.name
-        and kind.name.upper() in ["SCHEMA", "DATABASE"]
+        type(expression) is exp.Use
+        and type(kind := expression.args.get("kind")) is exp.Var
+        and (kind_name := _upper(kind.name)) in {"SCHEMA", "DATABASE"}
     ):
         assert expression.this, f"No identifier for USE expression {expression}"
 
-        if kind.name.upper() == "DATABASE":
+        if kind_name == "DATABASE":
             # duckdb's default schema is main
             name = f"{expression.this.name}.main"
         else:
@@ -689,6 +731,24 @@ def set_schema(expression: exp.Expression, current_database: str | None) -> exp.
     return expression
 
 
+SQL_SHOW_OBJECTS = """
+select
+    to_timestamp(0)::timestamptz as 'created_on',
+    table_name as 'name',
+    case when table_type='BASE TABLE' then 'TABLE' else table_type end as 'kind',
+    table_catalog as 'database_name',
+    table_schema as 'schema_name'
+from information_schema.tables
+"""
+
+_SHOW_OBJECTS_TERSE = parse_one(SQL_SHOW_OBJECTS, read="duckdb")
+_SHOW_OBJECTS = _SHOW_OBJECTS_TERSE.select(exp.alias_(exp.null(), "comment", quoted=True))
+_TABLES_ONLY = parse_one("table_type = 'BASE TABLE'", read="duckdb")
+_EXCLUDE_FAKESNOW_TABLES = parse_one(
+    "not (table_schema == 'information_schema' and table_name like '_fs_%%')", read="duckdb"
+)
+
+
 def show_objects_tables(expression: exp.Expression, current_database: str | None = None) -> exp.Expression:
     """Transform SHOW OBJECTS/TABLES to a query against the information_schema.tables table.
 
@@ -717,33 +777,28 @@ def show_objects_tables(expression: exp.Expression, current_database: str | None
         catalog = None
         schema = None
 
-    tables_only = "table_type = 'BASE TABLE' and " if show == "TABLES" else ""
-    exclude_fakesnow_tables = "not (table_schema == 'information_schema' and table_name like '_fs_%%')"
+    conditions = [_TABLES_ONLY.copy()] if show == "TABLES" else []
+    conditions.append(_EXCLUDE_FAKESNOW_TABLES.copy())
     # without a database will show everything in the "account"
-    table_catalog = f" and table_catalog = '{catalog}'" if catalog else ""
-    schema = f" and table_schema = '{schema}'" if schema else ""
-    limit = limit.sql() if (limit := expression.args.get("limit")) and isinstance(limit, exp.Expression) else ""
-
-    columns = [
-        "to_timestamp(0)::timestamptz as 'created_on'",
-        "table_name as 'name'",
-        "case when table_type='BASE TABLE' then 'TABLE' else table_type end as 'kind'",
-        "table_catalog as 'database_name'",
-        "table_schema as 'schema_name'",
-    ]
-
-    terse = expression.args["terse"]
-    if not terse:
-        columns.append('null as "comment"')
-
-    columns_str = ", ".join(columns)
-
-    query = (
-        f"SELECT {columns_str} from information_schema.tables "
-        f"where {tables_only}{exclude_fakesnow_tables}{table_catalog}{schema}{limit}"
-    )
+    if catalog:
+        conditions.append(exp.column("table_catalog").eq(exp.Literal.string(catalog)))
+    if schema:
+        conditions.append(exp.column("table_schema").eq(exp.Literal.string(schema)))
+
+    query = (_SHOW_OBJECTS_TERSE if expression.args["terse"] else _SHOW_OBJECTS).copy()
+    query = query.where(exp.and_(*conditions, copy=False), copy=False)
+    if (limit := expression.args.get("limit")) and isinstance(limit, exp.Expression):
+        query = query.limit(limit, copy=False)
+
+    return query
 
-    return sqlglot.parse_one(query, read="duckdb")
+
+def _extend_where(query: exp.Expression, *conditions: exp.Expression) -> exp.Expression:
+    # extend the query's existing conjunction rather than use Select.where(), which would parenthesize it
+    where: exp.Where = query.args["where"]
+    for condition in conditions:
+        where.set("this", exp.And(this=where.this, expression=condition))
+    return query
 
 
 SQL_SHOW_SCHEMAS = """
@@ -757,6 +812,8 @@ from information_schema.schemata
 where catalog_name not in ('memory', 'system', 'temp') and schema_name not in ('main', 'pg_catalog')
 """
 
+_SHOW_SCHEMAS = parse_one(SQL_SHOW_SCHEMAS, read="duckdb")
+
 
 def show_schemas(expression: exp.Expression, current_database: str | None = None) -> exp.Expression:
     """Transform SHOW SCHEMAS to a query against the information_schema.schemata table.
@@ -769,13 +826,18 @@ def show_schemas(expression: exp.Expression, current_database: str | None = None
         else:
             database = current_database
 
-        return sqlglot.parse_one(
-            f"{SQL_SHOW_SCHEMAS} and catalog_name = '{database}'" if database else SQL_SHOW_SCHEMAS, read="duckdb"
-        )
+        query = _SHOW_SCHEMAS.copy()
+        if database:
+            _extend_where(query, exp.column("catalog_name").eq(exp.Literal.string(database)))
+        return query
 
     return expression
 
 
+# searched case insensitively rather than upper casing the whole command, also matches UNSET TAG
+_SET_TAG = re.compile("SET TAG", re.IGNORECASE)
+
+
 def tag(expression: exp.Expression) -> exp.Expression:
     """Handle tags. Transfer tags into upserts of the tag table.
 
@@ -795,15 +857,15 @@ def tag(expression: exp.Expression) -> exp.Expression:
     if isinstance(expression, exp.AlterTable) and (actions := expression.args.get("actions")):
         for a in actions:
             if isinstance(a, exp.Set) and a.args["tag"]:
-                return SUCCESS_NOP
+                return _success_nop()
     elif (
         isinstance(expression, exp.Command)
         and (cexp := expression.args.get("expression"))
         and isinstance(cexp, str)
-        and "SET TAG" in cexp.upper()
+        and _SET_TAG.search(cexp)
     ):
         # alter table modify column set tag
-        return SUCCESS_NOP
+        return _success_nop()
 
     return expression
 
@@ -824,11 +886,7 @@ def to_date(expression: exp.Expression) -> exp.Expression:
         exp.Expression: The transformed expression.
     """
 
-    if (
-        isinstance(expression, exp.Anonymous)
-        and isinstance(expression.this, str)
-        and expression.this.upper() == "TO_DATE"
-    ):
+    if type(expression) is exp.Anonymous and isinstance(name := expression.this, str) and _upper(name) == "TO_DATE":
         return exp.Cast(
             this=expression.expressions[0],
             to=exp.DataType(this=exp.DataType.Type.DATE, nested=False, prefix=False),
@@ -841,42 +899,14 @@ def _get_to_number_args(e: exp.ToNumber) -> tuple[exp.Expression | None, exp.Exp
     arg_precision = e.args.get("precision")
     arg_scale = e.args.get("scale")
 
-    _format = None
-    _precision = None
-    _scale = None
-
     # to_number(value, <format>, <precision>, <scale>)
-    if arg_format:
-        if arg_format.is_string:
-            # to_number('100', 'TM9' ...)
-            _format = arg_format
-
-            # to_number('100', 'TM9', 10 ...)
-            if arg_precision:
-                _precision = arg_precision
-
-                # to_number('100', 'TM9', 10, 2)
-                if arg_scale:
-                    _scale = arg_scale
-            else:
-                pass
-        else:
-            # to_number('100', 10, ...)
-            # arg_format is not a string, so it must be precision.
-            _precision = arg_format
-
-            # to_number('100', 10, 2)
-            # And arg_precision must be scale
-            if arg_precision:
-                _scale = arg_precision
-    else:
-        # If format is not provided, just check for precision and scale directly
-        if arg_precision:
-            _precision = arg_precision
-            if arg_scale:
-                _scale = arg_scale
+    if arg_format and not arg_format.is_string:
+        # to_number('100', 10, 2)
+        # arg_format is not a string, so it must be precision. And arg_precision must be scale
+        return None, arg_format, arg_precision
 
-    return _format, _precision, _scale
+    # to_number('100', 'TM9', 10, 2), or no format at all
+    return arg_format, arg_precision, arg_scale if arg_precision else None
 
 
 def to_decimal(expression: exp.Expression) -> exp.Expression:
@@ -901,18 +931,19 @@ def to_decimal(expression: exp.Expression) -> exp.Expression:
         )
 
     if (
-        isinstance(expression, exp.Anonymous)
-        and isinstance(expression.this, str)
-        and expression.this.upper() in ["TO_DECIMAL", "TO_NUMERIC"]
+        type(expression) is exp.Anonymous
+        and isinstance(name := expression.this, str)
+        and _upper(name) in {"TO_DECIMAL", "TO_NUMERIC"}
     ):
         expressions: list[exp.Expression] = expression.expressions
+        num_args = len(expressions)
 
-        if len(expressions) > 1 and expressions[1].is_string:
+        if num_args > 1 and expressions[1].is_string:
             # see https://docs.snowflake.com/en/sql-reference/functions/to_decimal#arguments
-            raise NotImplementedError(f"{expression.this} with format argument")
+            raise NotImplementedError(f"{name} with format argument")
 
-        precision = expressions[1] if len(expressions) > 1 else exp.Literal(this="38", is_string=False)
-        scale = expressions[2] if len(expressions) > 2 else exp.Literal(this="0", is_string=False)
+        precision = expressions[1] if num_args > 1 else exp.Literal(this="38", is_string=False)
+        scale = expressions[2] if num_args > 2 else exp.Literal(this="0", is_string=False)
 
         return exp.Cast(
             this=expressions[0],
@@ -942,8 +973,10 @@ def to_timestamp_ntz(expression: exp.Expression) -> exp.Expression:
     Because it's not yet supported by sqlglot, see https://github.com/tobymao/sqlglot/issues/2748
     """
 
-    if isinstance(expression, exp.Anonymous) and (
-        isinstance(expression.this, str) and expression.this.upper() == "TO_TIMESTAMP_NTZ"
+    if (
+        type(expression) is exp.Anonymous
+        and isinstance(name := expression.this, str)
+        and _upper(name) == "TO_TIMESTAMP_NTZ"
     ):
         return exp.StrToTime(
             this=expression.expressions[0],
@@ -961,15 +994,24 @@ def timestamp_ntz_ns(expression: exp.Expression) -> exp.Expression:
     if (
         isinstance(expression, exp.DataType)
         and expression.this == exp.DataType.Type.TIMESTAMP
-        and exp.DataTypeParam(this=exp.Literal(this="9", is_string=False)) in expression.expressions
+        and any(_is_nanosecond_precision(param) for param in expression.expressions)
     ):
-        new = expression.copy()
-        del new.args["expressions"]
-        return new
+        del expression.args["expressions"]
 
     return expression
 
 
+def _is_nanosecond_precision(param: exp.Expression) -> bool:
+    # check the shape of the param rather than compare it to a newly constructed DataTypeParam
+    return (
+        type(param) is exp.DataTypeParam
+        and type(lit := param.this) is exp.Literal
+        and lit.this == "9"
+        and not lit.is_string
+        and not param.expression
+    )
+
+
 def try_parse_json(expression: exp.Expression) -> exp.Expression:
     """Convert TRY_PARSE_JSON() to TRY_CAST(... as JSON).
 
@@ -985,9 +1027,9 @@ def try_parse_json(expression: exp.Expression) -> exp.Expression:
     """
 
     if (
-        isinstance(expression, exp.Anonymous)
-        and isinstance(expression.this, str)
-        and expression.this.upper() == "TRY_PARSE_JSON"
+        type(expression) is exp.Anonymous
+        and isinstance(name := expression.this, str)
+        and _upper(name) == "TRY_PARSE_JSON"
     ):
         expressions = expression.expressions
         return exp.TryCast(
@@ -1018,9 +1060,7 @@ def semi_structured_types(expression: exp.Expression) -> exp.Expression:
         exp.DataType.Type.OBJECT,
         exp.DataType.Type.VARIANT,
     ]:
-        new = expression.copy()
-        new.args["this"] = exp.DataType.Type.JSON
-        return new
+        expression.args["this"] = exp.DataType.Type.JSON
 
     return expression
 
@@ -1042,10 +1082,14 @@ def upper_case_unquoted_identifiers(expression: exp.Expression) -> exp.Expressio
         exp.Expression: The transformed expression.
     """
 
-    if isinstance(expression, exp.Identifier) and not expression.quoted and isinstance(expression.this, str):
-        new = expression.copy()
-        new.set("this", expression.this.upper())
-        return new
+    if (
+        isinstance(expression, exp.Identifier)
+        and not expression.quoted
+        and isinstance(name := expression.this, str)
+        # skip identifiers that are already upper case rather than allocating an identical string
+        and not name.isupper()
+    ):
+        expression.args["this"] = name.upper()
 
     return expression
 
@@ -1060,27 +1104,34 @@ def values_columns(expression: exp.Expression) -> exp.Expression:
     if (
         isinstance(expression, exp.Values)
         and not expression.alias
+        # the parser puts each row of VALUES in a Tuple, so there's no need to search for one
+        and (rows := expression.expressions)
+        and isinstance(values := rows[0], exp.Tuple)
         and expression.find_ancestor(exp.Select)
-        and (values := expression.find(exp.Tuple))
     ):
-        num_columns = len(values.expressions)
-        columns = [exp.Identifier(this=f"COLUMN{i + 1}", quoted=True) for i in range(num_columns)]
+        columns = [exp.Identifier(this=f"COLUMN{i}", quoted=True) for i in range(1, len(values.expressions) + 1)]
         expression.set("alias", exp.TableAlias(this=exp.Identifier(this="_", quoted=False), columns=columns))
 
     return expression
 
 
+_SHOW_USERS = parse_one(f"SELECT * FROM {USERS_TABLE_FQ_NAME}", read="duckdb")
+
+
 def show_users(expression: exp.Expression) -> exp.Expression:
     """Transform SHOW USERS to a query against the global database's information_schema._fs_users table.
 
     https://docs.snowflake.com/en/sql-reference/sql/show-users
     """
     if isinstance(expression, exp.Show) and isinstance(expression.this, str) and expression.this.upper() == "USERS":
-        return sqlglot.parse_one(f"SELECT * FROM {USERS_TABLE_FQ_NAME}", read="duckdb")
+        return _SHOW_USERS.copy()
 
     return expression
 
 
+_INSERT_USER = parse_one(f"INSERT INTO {USERS_TABLE_FQ_NAME} (name) VALUES ('')", read="duckdb")
+
+
 def create_user(expression: exp.Expression) -> exp.Expression:
     """Transform CREATE USER to a query against the global database's information_schema._fs_users table.
 
@@ -1091,14 +1142,70 @@ def create_user(expression: exp.Expression) -> exp.Expression:
     if isinstance(expression, exp.Command) and expression.this == "CREATE":
         sub_exp = expression.expression.strip()
         if sub_exp.upper().startswith("USER"):
-            _, name, *ignored = sub_exp.split(" ")
+            _, *args = sub_exp.split()
+            if not args:
+                raise ValueError(f"No name for `CREATE {sub_exp}`")
+            name, *ignored = args
             if ignored:
                 raise NotImplementedError(f"`CREATE USER` with {ignored} not yet supported")
-            return sqlglot.parse_one(f"INSERT INTO {USERS_TABLE_FQ_NAME} (name) VALUES ('{name}')", read="duckdb")
+            insert = _INSERT_USER.copy()
+            # a literal rather than formatted into the sql, so the name is quoted correctly
+            insert.expression.expressions[0].set("expressions", [exp.Literal.string(name)])
+            return insert
 
     return expression
 
 
+SQL_SHOW_KEYS = """
+SELECT
+    to_timestamp(0)::timestamptz as created_on,
+    database_name as database_name,
+    schema_name as schema_name,
+    table_name as table_name,
+    unnest(constraint_column_names) as column_name,
+    1 as key_sequence,
+    LOWER(CONCAT(database_name, '_', schema_name, '_', table_name, '_pkey')) AS constraint_name,
+    'false' as rely,
+    null as "comment"
+FROM duckdb_constraints
+WHERE constraint_type = '{kind} KEY'
+  AND table_name NOT LIKE '_fs_%'
+"""
+
+SQL_SHOW_IMPORTED_KEYS = """
+SELECT
+    to_timestamp(0)::timestamptz as created_on,
+
+    '' as pk_database_name,
+    '' as pk_schema_name,
+    '' as pk_table_name,
+    '' as pk_column_name,
+    unnest(constraint_column_names) as pk_column_name,
+
+    database_name as fk_database_name,
+    schema_name as fk_schema_name,
+    table_name as fk_table_name,
+    unnest(constraint_column_names) as fk_column_name,
+    1 as key_sequence,
+    'NO ACTION' as update_rule,
+    'NO ACTION' as delete_rule,
+    LOWER(CONCAT(database_name, '_', schema_name, '_', table_name, '_pkey')) AS fk_name,
+    LOWER(CONCAT(database_name, '_', schema_name, '_', table_name, '_pkey')) AS pk_name,
+    'NOT DEFERRABLE' as deferrability,
+    'false' as rely,
+    null as "comment"
+FROM duckdb_constraints
+WHERE constraint_type = 'PRIMARY KEY'
+  AND table_name NOT LIKE '_fs_%'
+"""
+
+_SHOW_KEYS = {
+    "PRIMARY": parse_one(SQL_SHOW_KEYS.format(kind="PRIMARY")),
+    "UNIQUE": parse_one(SQL_SHOW_KEYS.format(kind="UNIQUE")),
+    "FOREIGN": parse_one(SQL_SHOW_IMPORTED_KEYS),
+}
+
+
 def show_keys(
     expression: exp.Expression,
     current_database: str | None = None,
@@ -1118,51 +1225,7 @@ def show_keys(
         and isinstance(expression.this, str)
         and expression.this.upper() == f"{snowflake_kind} KEYS"
     ):
-        if kind == "FOREIGN":
-            statement = f"""
-                SELECT
-                    to_timestamp(0)::timestamptz as created_on,
-
-                    '' as pk_database_name,
-                    '' as pk_schema_name,
-                    '' as pk_table_name,
-                    '' as pk_column_name,
-                    unnest(constraint_column_names) as pk_column_name,
-
-                    database_name as fk_database_name,
-                    schema_name as fk_schema_name,
-                    table_name as fk_table_name,
-                    unnest(constraint_column_names) as fk_column_name,
-                    1 as key_sequence,
-                    'NO ACTION' as update_rule,
-                    'NO ACTION' as delete_rule,
-                    LOWER(CONCAT(database_name, '_', schema_name, '_', table_name, '_pkey')) AS fk_name,
-                    LOWER(CONCAT(database_name, '_', schema_name, '_', table_name, '_pkey')) AS pk_name,
-                    'NOT DEFERRABLE' as deferrability,
-                    'false' as rely,
-                    null as "comment"
-                FROM duckdb_constraints
-                WHERE constraint_type = 'PRIMARY KEY'
-                  AND database_name = '{current_database}'
-                  AND table_name NOT LIKE '_fs_%'
-                """
-        else:
-            statement = f"""
-                SELECT
-                    to_timestamp(0)::timestamptz as created_on,
-                    database_name as database_name,
-                    schema_name as schema_name,
-                    table_name as table_name,
-                    unnest(constraint_column_names) as column_name,
-                    1 as key_sequence,
-                    LOWER(CONCAT(database_name, '_', schema_name, '_', table_name, '_pkey')) AS constraint_name,
-                    'false' as rely,
-                    null as "comment"
-                FROM duckdb_constraints
-                WHERE constraint_type = '{kind} KEY'
-                  AND database_name = '{current_database}'
-                  AND table_name NOT LIKE '_fs_%'
-                """
+        conditions = [exp.column("database_name").eq(exp.Literal.string(f"{current_database}"))]
 
         scope_kind = expression.args.get("scope_kind")
         if scope_kind:
@@ -1172,11 +1235,167 @@ def show_keys(
                 db = table and table.db
                 schema = table and table.name
                 if db:
-                    statement += f"AND database_name = '{db}' "
+                    conditions.append(exp.column("database_name").eq(exp.Literal.string(db)))
 
                 if schema:
-                    statement += f"AND schema_name = '{schema}' "
+                    conditions.append(exp.column("schema_name").eq(exp.Literal.string(schema)))
             else:
                 raise NotImplementedError(f"SHOW PRIMARY KEYS with {scope_kind} not yet supported")
-        return sqlglot.parse_one(statement)
+
+        return _extend_where(_SHOW_KEYS[kind].copy(), *conditions)
+    return expression
+
+
+Transform = Callable[[exp.Expression], exp.Expression]
+
+
+@cache
+def _with_subclasses(node_type: type[exp.Expression]) -> tuple[type[exp.Expression], ...]:
+    types = [node_type]
+    for sub in node_type.__subclasses__():
+        types.extend(_with_subclasses(sub))
+    return tuple(types)
+
+
+def _dispatch(transform: Transform, *node_types: type[exp.Expression]) -> dict[type[exp.Expression], Transform]:
+    # key on each subclass too, so a lookup by type(node) matches the same nodes as the transform's isinstance check
+    return {t: transform for node_type in node_types for t in _with_subclasses(node_type)}
+
+
+def _chain(*transforms: Transform) -> Transform:
+    def chained(expression: exp.Expression) -> exp.Expression:
+        for transform in transforms:
+            expression = transform(expression)
+        return expression
+
+    return chained
+
+
+def _transform(
+    expression: exp.Expression,
+    dispatch: Mapping[type[exp.Expression], Transform],
+    seen: set[type[exp.Expression]],
+) -> exp.Expression:
+    """Transform expression in place, calling the transform registered for each node's type.
+
+    Equivalent to Expression.transform(copy=False) but nodes without a registered transform are skipped
+    with a dict lookup, rather than a function call. The types of the nodes in the transformed tree are
+    added to seen, which may also hold the types of nodes the transforms removed.
+    """
+    root = expression
+    new_node = None
+
+    # like Expression.transform, don't descend into nodes that have just been replaced
+    for node in expression.dfs(prune=lambda n: n is not new_node):  # noqa: B023
+        seen.add(type(node))
+        if not (transform := dispatch.get(type(node))):
+            new_node = node
+            continue
+
+        parent, arg_key, index = node.parent, node.arg_key, node.index
+        new_node = transform(node)
+
+        if new_node is not node:
+            # the replacement won't be visited, so record its types here
+            seen.update(type(n) for n in new_node.walk())
+
+            if node is expression:
+                root = new_node
+            else:
+                parent.set(arg_key, new_node, index)
+
+    return root
+
+
+@lru_cache(maxsize=64)
+def _pipeline(
+    current_database: str | None, db_path: Path | None
+) -> tuple[dict[type[exp.Expression], Transform] | Transform, ...]:
+    # the order matters, because transforms can rewrite the nodes that a later transform matches on.
+    # a dispatch is applied to every node in the tree, a bare transform to the root only
+    return (
+        _dispatch(upper_case_unquoted_identifiers, exp.Identifier),
+        # USE and CREATE DATABASE are only ever the whole statement
+        partial(set_schema, current_database=current_database),
+        partial(create_database, db_path=db_path),
+        _dispatch(_comment_on_create, exp.Create)
+        | _dispatch(_comment_on_comment, exp.Comment)
+        | _dispatch(_comment_on_alter_table, exp.AlterTable),
+        _dispatch(extract_comment_on_columns, exp.AlterTable),
+        _dispatch(information_schema_fs_columns_snowflake, exp.Select),
+        _dispatch(information_schema_fs_tables_ext, exp.Select),
+        _dispatch(drop_schema_cascade, exp.Drop),
+        _dispatch(tag, exp.AlterTable, exp.Command),
+        _dispatch(semi_structured_types, exp.DataType),
+        _dispatch(try_parse_json, exp.Anonymous),
+        # indices_to_json_extract must be before regex_substr
+        _dispatch(indices_to_json_extract, exp.Bracket),
+        _dispatch(json_extract_cast_as_varchar, exp.Cast),
+        _dispatch(json_extract_cased_as_varchar, exp.Upper, exp.Lower),
+        _dispatch(json_extract_precedence, exp.JSONExtract),
+        _dispatch(flatten, exp.Lateral),
+        _dispatch(regex_replace, exp.RegexpReplace),
+        _dispatch(regex_substr, exp.RegexpExtract),
+        _dispatch(values_columns, exp.Values),
+        _dispatch(to_date, exp.Anonymous),
+        _dispatch(to_decimal, exp.ToNumber, exp.Anonymous),
+        _dispatch(to_timestamp_ntz, exp.Anonymous),
+        _dispatch(to_timestamp, exp.UnixToTime),
+        _dispatch(object_construct, exp.Struct),
+        # chained transforms share a single walk, so none of them can produce a node another one in the chain
+        # would match, or rewrite a node another one reads
+        _dispatch(_chain(timestamp_ntz_ns, float_to_double, integer_precision), exp.DataType),
+        _dispatch(extract_text_length, exp.Create, exp.AlterTable),
+        _dispatch(sample, exp.TableSample),
+        _dispatch(array_size, exp.ArraySize),
+        _dispatch(random, exp.Select),
+        _dispatch(identifier, exp.Anonymous),
+        _dispatch(array_agg_within_group, exp.WithinGroup),
+        _dispatch(array_agg_to_json, exp.ArrayAgg),
+        _dispatch(
+            _chain(
+                partial(show_schemas, current_database=current_database),
+                partial(show_objects_tables, current_database=current_database),
+                # TODO collapse into a single show_keys function
+                partial(show_keys, current_database=current_database, kind="PRIMARY"),
+                partial(show_keys, current_database=current_database, kind="UNIQUE"),
+                partial(show_keys, current_database=current_database, kind="FOREIGN"),
+                show_users,
+            ),
+            exp.Show,
+        ),
+        _dispatch(create_user, exp.Command),
+    )
+
+
+def apply_transforms(
+    expression: exp.Expression, current_database: str | None = None, db_path: Path | None = None
+) -> exp.Expression:
+    """Transform a snowflake expression into one that can be executed by duckdb.
+
+    The expression is copied once, and the copy is then transformed in place by each transform in turn.
+
+    Args:
+        expression (exp.Expression): the expression that will be transformed.
+        current_database (str | None): the connection's current database.
+        db_path (Path | None): the directory databases are stored in, or None for in-memory databases.
+
+    Returns:
+        exp.Expression: The transformed expression.
+    """
+
+    pipeline = _pipeline(current_database, db_path)
+    expression = expression.copy()
+
+    # skip transforms that can't match any node in the tree without walking it
+    present = {type(node) for node in expression.walk()}
+    for step in pipeline:
+        if not isinstance(step, dict):
+            if (new_root := step(expression)) is not expression:
+                present.update(type(node) for node in new_root.walk())
+                expression = new_root
+        elif not present.isdisjoint(step):
+            present = set()
+            expression = _transform(expression, step, present)
+
     return expression
@@ -6,7 +6,11 @@ from sqlglot import exp
 
 from fakesnow.transforms import (
     SUCCESS_NOP,
+    _chain,
+    _dispatch,
     _get_to_number_args,
+    _transform,
+    apply_transforms,
     array_agg_within_group,
     array_size,
     create_database,
@@ -46,6 +50,81 @@ from fakesnow.transforms import (
 )
 
 
+def test_apply_transforms() -> None:
+    e = sqlglot.parse_one("select data[0] from table1 where id = random(42)", read="snowflake")
+    original_sql = e.sql()
+
+    transformed = apply_transforms(e)
+
+    assert (
+        transformed.sql(dialect="duckdb")
+        == "SELECT (DATA -> '$[0]') FROM TABLE1 WHERE ID = CAST(((RANDOM() - 0.5) * 9223372036854775807) AS BIGINT)"
+    )
+    assert transformed.args["seed"] == "42/2147483647-0.5"
+    # the expression passed in is not modified
+    assert e.sql() == original_sql
+
+
+def test_apply_transforms_shared_nodes() -> None:
+    # the transforms edit a single copy in place, so a node used twice in a replacement would be transformed twice
+    transformed = apply_transforms(sqlglot.parse_one("select array_size(array_agg(x)) from t", read="snowflake"))
+
+    assert (
+        transformed.sql(dialect="duckdb")
+        == "SELECT CASE WHEN JSON_ARRAY_LENGTH(TO_JSON(ARRAY_AGG(X))) THEN JSON_ARRAY_LENGTH(TO_JSON(ARRAY_AGG(X))) END FROM T"  # noqa: E501
+    )
+    nodes = list(transformed.walk())
+    assert len(nodes) == len({id(node) for node in nodes})
+
+
+def test_apply_transforms_introduced_types() -> None:
+    # json_extract_precedence is skipped for queries without a JSONExtract, but must still run on the
+    # JSONExtract that indices_to_json_extract introduces in an earlier pass
+    assert (
+        apply_transforms(sqlglot.parse_one("select data['k'] from t", read="snowflake")).sql(dialect="duckdb")
+        == "SELECT (DATA -> '$.k') FROM T"
+    )
+
+
+def test_chain() -> None:
+    chained = _chain(lambda e: exp.Paren(this=e), lambda e: exp.Not(this=e))
+
+    assert chained(exp.column("x")).sql() == "NOT (x)"
+
+
+def test_dispatch() -> None:
+    def transform(e: exp.Expression) -> exp.Expression:
+        return e
+
+    # subclasses are keys too, so a lookup by type(node) matches the same nodes as isinstance
+    assert _dispatch(transform, exp.Cast) == {exp.Cast: transform, exp.TryCast: transform}
+
+
+def test_transform() -> None:
+    e = sqlglot.parse_one("select to_timestamp(0)", read="snowflake")
+
+    # the replacement wraps the UnixToTime it replaced, which isn't descended into and transformed again
+    seen = set()
+    e = _transform(e, _dispatch(to_timestamp, exp.UnixToTime), seen)
+    assert e.sql(dialect="duckdb") == "SELECT CAST(TO_TIMESTAMP(0) AS TIMESTAMP)"
+    # the types in the replacement are seen, for the passes that follow
+    assert {exp.Cast, exp.DataType} <= seen
+
+    # but the next pass does visit it
+    e = _transform(e, _dispatch(to_timestamp, exp.UnixToTime), set())
+    assert e.sql(dialect="duckdb") == "SELECT CAST(CAST(TO_TIMESTAMP(0) AS TIMESTAMP) AS TIMESTAMP)"
+
+
+def test_transform_seen_in_place() -> None:
+    # types added to a node that is modified in place rather than replaced are seen too
+    seen = set()
+    e = _transform(
+        sqlglot.parse_one("select * from (values (1))", read="snowflake"), _dispatch(values_columns, exp.Values), seen
+    )
+    assert e.sql() == 'SELECT * FROM (VALUES (1)) AS _("COLUMN1")'
+    assert exp.TableAlias in seen
+
+
 def test_array_size() -> None:
     assert (
         sqlglot.parse_one("""select array_size(parse_json('["a","b"]'))""").transform(array_size).sql(dialect="duckdb")
@@ -350,6 +429,13 @@ def test_show_objects_tables() -> None:
         sqlglot.parse_one("show terse objects in db1.schema1", read="snowflake").transform(show_objects_tables).sql()
         == """SELECT CAST(UNIX_TO_TIME(0) AS TIMESTAMPTZ) AS "created_on", table_name AS "name", CASE WHEN table_type = 'BASE TABLE' THEN 'TABLE' ELSE table_type END AS "kind", table_catalog AS "database_name", table_schema AS "schema_name" FROM information_schema.tables WHERE NOT (table_schema = 'information_schema' AND table_name LIKE '_fs_%%') AND table_catalog = 'db1' AND table_schema = 'schema1'"""  # noqa: E501
     )
+    # quoted names are emitted as escaped string literals
+    assert (
+        sqlglot.parse_one('show terse objects in "o\'db"."my\'schema"', read="snowflake")
+        .transform(show_objects_tables)
+        .sql()
+        == """SELECT CAST(UNIX_TO_TIME(0) AS TIMESTAMPTZ) AS "created_on", table_name AS "name", CASE WHEN table_type = 'BASE TABLE' THEN 'TABLE' ELSE table_type END AS "kind", table_catalog AS "database_name", table_schema AS "schema_name" FROM information_schema.tables WHERE NOT (table_schema = 'information_schema' AND table_name LIKE '_fs_%%') AND table_catalog = 'o''db' AND table_schema = 'my''schema'"""  # noqa: E501
+    )
     assert (
         sqlglot.parse_one("show terse objects in database", read="snowflake").transform(show_objects_tables).sql()
         == """SELECT CAST(UNIX_TO_TIME(0) AS TIMESTAMPTZ) AS "created_on", table_name AS "name", CASE WHEN table_type = 'BASE TABLE' THEN 'TABLE' ELSE table_type END AS "kind", table_catalog AS "database_name", table_schema AS "schema_name" FROM information_schema.tables WHERE NOT (table_schema = 'information_schema' AND table_name LIKE '_fs_%%')"""  # noqa: E501
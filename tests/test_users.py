@@ -1,4 +1,10 @@
+import duckdb
+import pytest
 import snowflake.connector.cursor
+from sqlglot import exp
+
+from fakesnow.global_database import USERS_TABLE_FQ_NAME, create_global_database
+from fakesnow.transforms import create_user
 
 
 def test_show_users_base_case(cur: snowflake.connector.cursor.SnowflakeCursor):
@@ -17,3 +23,28 @@ def test_show_users_with_users(cur: snowflake.connector.cursor.SnowflakeCursor):
     rows = result.fetchall()
     names = [row[0] for row in rows]
     assert names == ["foo", "bar"]
+
+
+def test_create_user_name_with_quote():
+    # the snowflake tokenizer won't accept an unclosed quote, so transform the Command directly
+    conn = duckdb.connect()
+    create_global_database(conn)
+
+    conn.execute(create_user(exp.Command(this="CREATE", expression="USER o'brien")).sql(dialect="duckdb"))
+
+    assert conn.execute(f"SELECT name FROM {USERS_TABLE_FQ_NAME}").fetchall() == [("o'brien",)]
+
+
+def test_create_user_whitespace():
+    conn = duckdb.connect()
+    create_global_database(conn)
+
+    conn.execute(create_user(exp.Command(this="CREATE", expression="USER  foo\t")).sql(dialect="duckdb"))
+
+    assert conn.execute(f"SELECT name FROM {USERS_TABLE_FQ_NAME}").fetchall() == [("foo",)]
+
+    with pytest.raises(ValueError, match="No name"):
+        create_user(exp.Command(this="CREATE", expression="USER"))
+
+    with pytest.raises(NotImplementedError, match=r"\['password', '=', 'x'\]"):
+        create_user(exp.Command(this="CREATE", expression="USER bar\tpassword = x"))